@@ -1,7 +1,49 @@
-from typing import Union
+from typing import Union, NamedTuple
 from numpy import ndarray
+import numpy as np
+import csv
 import tensorflow as tf
 
+# features stored in each tfrecord example, see build_tfrecords
+_TFRECORD_FEATURES = {
+    'image/encoded': tf.io.FixedLenFeature(shape=[], dtype=tf.string),
+    'mask/encoded': tf.io.FixedLenFeature(shape=[], dtype=tf.string),
+    'labels': tf.io.FixedLenSequenceFeature(shape=[], dtype=tf.int64, allow_missing=True),
+    'xmin': tf.io.FixedLenSequenceFeature(shape=[], dtype=tf.float32, allow_missing=True),
+    'ymin': tf.io.FixedLenSequenceFeature(shape=[], dtype=tf.float32, allow_missing=True),
+    'xmax': tf.io.FixedLenSequenceFeature(shape=[], dtype=tf.float32, allow_missing=True),
+    'ymax': tf.io.FixedLenSequenceFeature(shape=[], dtype=tf.float32, allow_missing=True),
+}
+
+# coordinate used to pad ground truth boxes to a fixed number, padded boxes can't overlap any default box (even if flipped)
+# so they are never matched during the encoding process
+_PADDING_BOXES_COORDINATE = -1e6
+
+# values related to default bounding boxes and settings needed by the encoding functions
+# they are passed by name as a single nested argument, so a single trace it's shared by all DataEncoderDecoder instances
+class _EncodingConstants(NamedTuple):
+    # corners coordinates for default bounding boxes
+    xmin_boxes_default: tf.Tensor
+    ymin_boxes_default: tf.Tensor
+    xmax_boxes_default: tf.Tensor
+    ymax_boxes_default: tf.Tensor
+    # ymin, ymax and area for default bounding boxes, stacked on the last axis
+    ymin_ymax_area_boxes_default: tf.Tensor
+    # centroids coordinates for default bounding boxes (center_x, center_y, width, height), stacked on the last axis
+    centroids_boxes_default: tf.Tensor
+    # reciprocals of default bounding boxes width/height multiplied by center_x/center_y offsets standard deviation
+    inv_w_std_x: tf.Tensor
+    inv_h_std_y: tf.Tensor
+    # reciprocals of width/height offsets standard deviation
+    inv_std_w: tf.Tensor
+    inv_std_h: tf.Tensor
+    # one hot encoded labels for each class (identity matrix), used as lookup table
+    labels_one_hot: tf.Tensor
+    # input image width
+    image_width: tf.Tensor
+    # minimum intersection over union threshold with ground truth boxes to consider a default bounding box not background
+    iou_threshold: tf.Tensor
+
 class DataEncoderDecoder:
     def __init__(
             self,
@@ -18,11 +60,13 @@ class DataEncoderDecoder:
             iou_threshold: float = 0.5,
             standard_deviations_centroids_offsets: tuple[float] = (0.1, 0.1, 0.2, 0.2),
             augmentation_horizontal_flip: bool = False,
+            jit_compile: bool = True,
+            max_boxes_ground_truth: int = 32,
         ) -> None:
         """
         class for read and encode data, designed to work with tensorflow data pipelines
         you must pass default bounding boxes expressed in corners coordinates, or in centroids coordinates, or both
-        (note for me -> probably not very efficient to store both coordinates! think about it in the future..)
+        centroids coordinates are always calculated from corners coordinates, once, and stored stacked on the last axis
 
         Args:
             num_classes (int): number of classes for object detection and segmentation problem, including background
@@ -42,6 +86,9 @@ class DataEncoderDecoder:
             standard_deviations_centroids_offsets (tuple[float], optional): standard deviations for offsets between ground truth and default bounding boxes, expected as (standard_deviation_center_x_offsets, standard_deviation_center_y_offsets, standard_deviation_width_offsets, standard_deviation_height_offsets). Defaults to (0.1, 0.1, 0.2, 0.2).
 
             augmentation_horizontal_flip (tuple[bool, float], optional): specify if horizontal flip data augmentation should be performed and the transformation probability. Defaults to (False, 0.5).
+
+            jit_compile (bool, optional): if True encoding and decoding are compiled with xla, ground truth boxes are padded to max_boxes_ground_truth. set it to False for debugging. Defaults to True.
+            max_boxes_ground_truth (int, optional): fixed number of ground truth boxes per sample, used only if jit_compile it's True. samples with more ground truth boxes raise an error, they are never dropped. Defaults to 32.
         """
 
         # set attributes
@@ -55,69 +102,123 @@ class DataEncoderDecoder:
             if any(corners is None for corners in (xmin_boxes_default, ymin_boxes_default, xmax_boxes_default, ymax_boxes_default)):
                 raise ValueError('you must pass all default bounding boxes corners coordinates!')
             else:
-                # set corners coordinates
-                self.xmin_boxes_default = tf.convert_to_tensor(xmin_boxes_default, dtype=tf.float32)
-                self.ymin_boxes_default = tf.convert_to_tensor(ymin_boxes_default, dtype=tf.float32)
-                self.xmax_boxes_default = tf.convert_to_tensor(xmax_boxes_default, dtype=tf.float32)
-                self.ymax_boxes_default = tf.convert_to_tensor(ymax_boxes_default, dtype=tf.float32)
-
-                # set centroids coordinates
-                self.center_x_boxes_default, self.center_y_boxes_default, self.width_boxes_default, self.height_boxes_default = self._coordinates_corners_to_centroids(
-                    xmin=self.xmin_boxes_default,
-                    ymin=self.ymin_boxes_default,
-                    xmax=self.xmax_boxes_default,
-                    ymax=self.ymax_boxes_default
-                )
+                # get corners coordinates
+                xmin_boxes_default, ymin_boxes_default, xmax_boxes_default, ymax_boxes_default = map(self._to_f32, (xmin_boxes_default, ymin_boxes_default, xmax_boxes_default, ymax_boxes_default))
 
         # validation - only centroids coordinates in input
         elif all(corners is None for corners in (xmin_boxes_default, ymin_boxes_default, xmax_boxes_default, ymax_boxes_default)):
             if any(centroids is None for centroids in (center_x_boxes_default, center_y_boxes_default, width_boxes_default, height_boxes_default)):
                 raise ValueError('you must pass all default bounding boxes centroids coordinates!')
             else:
-                # set centroids coordinates
-                self.center_x_boxes_default = tf.convert_to_tensor(center_x_boxes_default, dtype=tf.float32)
-                self.center_y_boxes_default = tf.convert_to_tensor(center_y_boxes_default, dtype=tf.float32)
-                self.width_boxes_default = tf.convert_to_tensor(width_boxes_default, dtype=tf.float32)
-                self.height_boxes_default = tf.convert_to_tensor(height_boxes_default, dtype=tf.float32)
-                
-                # set corners coordinates
-                self.xmin_boxes_default, self.ymin_boxes_default, self.xmax_boxes_default, self.ymax_boxes_default = self._coordinates_centroids_to_corners(
-                    center_x=self.center_x_boxes_default,
-                    center_y=self.center_y_boxes_default,
-                    width=self.width_boxes_default,
-                    height=self.height_boxes_default
+                # get corners coordinates, converted from the centroids coordinates
+                xmin_boxes_default, ymin_boxes_default, xmax_boxes_default, ymax_boxes_default = self._coordinates_centroids_to_corners(
+                    center_x=self._to_f32(center_x_boxes_default),
+                    center_y=self._to_f32(center_y_boxes_default),
+                    width=self._to_f32(width_boxes_default),
+                    height=self._to_f32(height_boxes_default)
                 )
 
         # validation - both corners and centroids coordinates in input
-        elif (all(corners is None for corners in (xmin_boxes_default, ymin_boxes_default, xmax_boxes_default, ymax_boxes_default)) and
-              all(centroids is None for centroids in (center_x_boxes_default, center_y_boxes_default, width_boxes_default, height_boxes_default))):
-            # set corners coordinates
-            self.xmin_boxes_default = tf.convert_to_tensor(xmin_boxes_default, dtype=tf.float32)
-            self.ymin_boxes_default = tf.convert_to_tensor(ymin_boxes_default, dtype=tf.float32)
-            self.xmax_boxes_default = tf.convert_to_tensor(xmax_boxes_default, dtype=tf.float32)
-            self.ymax_boxes_default = tf.convert_to_tensor(ymax_boxes_default, dtype=tf.float32)
-            
-            # set centroids coordinates
-            self.center_x_boxes_default = tf.convert_to_tensor(center_x_boxes_default, dtype=tf.float32)
-            self.center_y_boxes_default = tf.convert_to_tensor(center_y_boxes_default, dtype=tf.float32)
-            self.width_boxes_default = tf.convert_to_tensor(width_boxes_default, dtype=tf.float32)
-            self.height_boxes_default = tf.convert_to_tensor(height_boxes_default, dtype=tf.float32)            
-            
+        elif (all(corners is not None for corners in (xmin_boxes_default, ymin_boxes_default, xmax_boxes_default, ymax_boxes_default)) and
+              all(centroids is not None for centroids in (center_x_boxes_default, center_y_boxes_default, width_boxes_default, height_boxes_default))):
+            # get corners coordinates, no conversion needed (centroids coordinates are calculated from corners below)
+            xmin_boxes_default, ymin_boxes_default, xmax_boxes_default, ymax_boxes_default = map(self._to_f32, (xmin_boxes_default, ymin_boxes_default, xmax_boxes_default, ymax_boxes_default))
+
         # validation - some corners or centroids missing in input
         else:
-            raise ValueError('you must pass all default bounding boxes centroids coordinates, or corners coordinates or both!') 
+            raise ValueError('you must pass all default bounding boxes centroids coordinates, or corners coordinates or both!')
+
+        # set corners coordinates
+        self.xmin_boxes_default = xmin_boxes_default
+        self.ymin_boxes_default = ymin_boxes_default
+        self.xmax_boxes_default = xmax_boxes_default
+        self.ymax_boxes_default = ymax_boxes_default
+
+        # calculate centroids coordinates, stacked on the last axis so they can be used to decode all the 4 coordinates at once
+        # note: this is the only copy of the centroids coordinates, the corresponding properties are views on it
+        self._centroids_boxes_default = tf.stack(
+            self._coordinates_corners_to_centroids(xmin=self.xmin_boxes_default, ymin=self.ymin_boxes_default, xmax=self.xmax_boxes_default, ymax=self.ymax_boxes_default),
+            axis=1
+        )
 
-        # calculate area for default bounding boxes
-        self.boxes_area_default = tf.expand_dims(
-            input=(self.ymax_boxes_default - self.ymin_boxes_default + 1.0) * (self.xmax_boxes_default - self.xmin_boxes_default + 1.0),
+        # values needed for each sample during the encoding process, calculated once here
+        # the total number of default bounding boxes is stored as a python integer, while ymin, ymax and area are stacked so they can be selected with a single gather
+        # note: the area for default bounding boxes is stored only in this stack (last column)
+        self.num_boxes_default = int(self.xmin_boxes_default.shape[0])
+        self._ymin_ymax_area_boxes_default = tf.stack(
+            [
+                self.ymin_boxes_default,
+                self.ymax_boxes_default,
+                (self.ymax_boxes_default - self.ymin_boxes_default + 1.0) * (self.xmax_boxes_default - self.xmin_boxes_default + 1.0)
+            ],
             axis=1
         )
 
+        # reciprocals used to standardize the centroids offsets, so the encoding needs multiplications only
+        self._inv_w_std_x = tf.math.reciprocal(self.width_boxes_default * self.standard_deviation_center_x_offsets)
+        self._inv_h_std_y = tf.math.reciprocal(self.height_boxes_default * self.standard_deviation_center_y_offsets)
+        self._inv_std_w = 1.0 / self.standard_deviation_width_offsets
+        self._inv_std_h = 1.0 / self.standard_deviation_height_offsets
+
+        # standard deviations stacked on the last axis, used to decode all the 4 coordinates at once
+        self._standard_deviations_centroids_offsets = tf.constant(standard_deviations_centroids_offsets, dtype=tf.float32)
+
+        # one hot encoded labels for each class, used as lookup table during the encoding process
+        self._labels_one_hot = tf.eye(self.num_classes, dtype=tf.float32)
+
         # augmentation attributes
         self.augmentation_horizontal_flip = augmentation_horizontal_flip
 
+        # encoding function, compiled with xla if requested (decoding functions check jit_compile too)
+        # xla needs static shapes, so the compiled encoding works with a fixed number of (padded) ground truth boxes
+        self.jit_compile = jit_compile
+        self.max_boxes_ground_truth = max_boxes_ground_truth
+        self._encode = self._encode_ground_truth_labels_boxes_padded if self.jit_compile else self._encode_ground_truth_labels_boxes
+
+    @property
+    def center_x_boxes_default(self) -> tf.Tensor:
+        """
+        center x coordinates for default bounding boxes (centroids coordinates)
+        """
+        return self._centroids_boxes_default[:, 0]
+
+    @property
+    def center_y_boxes_default(self) -> tf.Tensor:
+        """
+        center y coordinates for default bounding boxes (centroids coordinates)
+        """
+        return self._centroids_boxes_default[:, 1]
+
+    @property
+    def width_boxes_default(self) -> tf.Tensor:
+        """
+        width for default bounding boxes (centroids coordinates)
+        """
+        return self._centroids_boxes_default[:, 2]
+
+    @property
+    def height_boxes_default(self) -> tf.Tensor:
+        """
+        height for default bounding boxes (centroids coordinates)
+        """
+        return self._centroids_boxes_default[:, 3]
+
+    @staticmethod
+    def _to_f32(coordinates: Union[ndarray, tf.Tensor]) -> tf.Tensor:
+        """
+        convert default bounding boxes coordinates to a float32 tensor
+
+        Args:
+            coordinates (Union[ndarray, tf.Tensor]): coordinates, as array or tensor
+
+        Returns:
+            tf.Tensor: float32 coordinates
+        """
+
+        return tf.cast(tf.convert_to_tensor(coordinates), dtype=tf.float32)
+
+    @staticmethod
     def _coordinates_corners_to_centroids(
-            self,
             xmin: tf.Tensor,
             ymin: tf.Tensor,
             xmax: tf.Tensor,
@@ -145,8 +246,8 @@ class DataEncoderDecoder:
 
         return center_x, center_y, width, height
 
+    @staticmethod
     def _coordinates_centroids_to_corners(
-            self,
             center_x: tf.Tensor,
             center_y: tf.Tensor,
             width: tf.Tensor,
@@ -174,144 +275,175 @@ class DataEncoderDecoder:
 
         return xmin, ymin, xmax, ymax
     
-    def _encode_ground_truth_labels_boxes(self, path_file_labels_boxes: str, augment_with_horizontal_flip: bool) -> tuple[tf.Tensor, tf.Tensor]:
+    def _encoding_constants(self) -> _EncodingConstants:
+        """
+        values related to default bounding boxes and settings needed by the encoding functions
+
+        Returns:
+            _EncodingConstants: default bounding boxes values, labels lookup table, image width and iou threshold
         """
-        encode ground truth data as required by a single-shot-detector network
-        this means assign labels and calculate standardized offsets for each default bounding boxes
+
+        return _EncodingConstants(
+            xmin_boxes_default=self.xmin_boxes_default,
+            ymin_boxes_default=self.ymin_boxes_default,
+            xmax_boxes_default=self.xmax_boxes_default,
+            ymax_boxes_default=self.ymax_boxes_default,
+            ymin_ymax_area_boxes_default=self._ymin_ymax_area_boxes_default,
+            centroids_boxes_default=self._centroids_boxes_default,
+            inv_w_std_x=self._inv_w_std_x,
+            inv_h_std_y=self._inv_h_std_y,
+            inv_std_w=self._inv_std_w,
+            inv_std_h=self._inv_std_h,
+            labels_one_hot=self._labels_one_hot,
+            image_width=self.image_width,
+            iou_threshold=self.iou_threshold
+        )
+
+    def _encode_ground_truth_labels_boxes(
+            self,
+            labels_ground_truth: tf.Tensor,
+            xmin_boxes_ground_truth: tf.Tensor,
+            ymin_boxes_ground_truth: tf.Tensor,
+            xmax_boxes_ground_truth: tf.Tensor,
+            ymax_boxes_ground_truth: tf.Tensor,
+            augment_with_horizontal_flip: bool
+        ) -> tuple[tf.Tensor, tf.Tensor]:
+        """
+        encode ground truth data as required by a single-shot-detector network, using this instance default bounding boxes (see _encode_impl)
 
         Args:
-            path_file_labels_boxes (str): path and filename for ground truth labels and boxes
+            labels_ground_truth (tf.Tensor): ground truth labels
+            xmin_boxes_ground_truth (tf.Tensor): ground truth boxes xmin coordinates
+            ymin_boxes_ground_truth (tf.Tensor): ground truth boxes ymin coordinates
+            xmax_boxes_ground_truth (tf.Tensor): ground truth boxes xmax coordinates
+            ymax_boxes_ground_truth (tf.Tensor): ground truth boxes ymax coordinates
             augment_with_horizontal_flip (bool): pass True if horizontal flip should be applied to input boxes, otherwise False
 
         Returns:
-            tuple[tf.Tensor, tf.Tensor]:
-                encoded data, a tuple with two tensor, respectively labels and offsets, with shape (total default boxes, num classes) and (total default boxes, 4)
-                labels are one hot encoded
-                offsets between ground truth and default bounding boxes are expressed as centroids offsets (center_x_offsets, center_y_offsets, width_offsets, height_offsets)
+            tuple[tf.Tensor, tf.Tensor]: encoded labels and offsets, with shape (total default boxes, num classes) and (total default boxes, 4)
         """
-        
-        # read labels boxes csv file as text, split text by lines and then decode csv data to tensors
-        labels_boxes = tf.strings.strip(tf.io.read_file(path_file_labels_boxes))
-        labels_boxes = tf.strings.split(labels_boxes, sep='\r\n')
-        labels_boxes = tf.io.decode_csv(labels_boxes, record_defaults=[int(), float(), float(), float(), float()])
 
-        # create ground truth labels and boxes tensors
-        labels_ground_truth, xmin_boxes_ground_truth, ymin_boxes_ground_truth, xmax_boxes_ground_truth, ymax_boxes_ground_truth = labels_boxes
+        return _encode_impl(self._encoding_constants(), labels_ground_truth, xmin_boxes_ground_truth, ymin_boxes_ground_truth, xmax_boxes_ground_truth, ymax_boxes_ground_truth, augment_with_horizontal_flip)
 
-        # augmentation - horizontal flip
-        if augment_with_horizontal_flip:
-            xmin_boxes_ground_truth, xmax_boxes_ground_truth = self.image_width - xmax_boxes_ground_truth, self.image_width - xmin_boxes_ground_truth
-
-        # calculate area for ground truth bounding boxes
-        boxes_area_ground_truth = (xmax_boxes_ground_truth - xmin_boxes_ground_truth + 1.0) * (ymax_boxes_ground_truth - ymin_boxes_ground_truth + 1.0)
-
-        # coordinates of intersections between each default bounding box and all ground truth bounding boxes
-        # it selects the maximum for xmin and ymin coordinates, the minimum for xmax and ymax coordinates
-        xmin_boxes_intersection = tf.math.maximum(tf.expand_dims(self.xmin_boxes_default, axis=1), tf.transpose(xmin_boxes_ground_truth))
-        ymin_boxes_intersection = tf.math.maximum(tf.expand_dims(self.ymin_boxes_default, axis=1), tf.transpose(ymin_boxes_ground_truth))
-        xmax_boxes_intersection = tf.math.minimum(tf.expand_dims(self.xmax_boxes_default, axis=1), tf.transpose(xmax_boxes_ground_truth))
-        ymax_boxes_intersection = tf.math.minimum(tf.expand_dims(self.ymax_boxes_default, axis=1), tf.transpose(ymax_boxes_ground_truth))
-
-        # area of intersection between each default bounding box and all ground truth bounding boxes
-        boxes_area_intersection = tf.math.maximum(0.0, xmax_boxes_intersection - xmin_boxes_intersection + 1.0) * tf.math.maximum(0.0, ymax_boxes_intersection - ymin_boxes_intersection + 1.0)
-
-        # calculate intersection over union between each default bounding box and all ground truth bounding boxes
-        # note that this is a matrix with shape (num default bounding boxes, num ground truth bounding boxes)
-        iou = boxes_area_intersection / (self.boxes_area_default + tf.transpose(boxes_area_ground_truth) - boxes_area_intersection)
-
-        # find best matches between ground truth and default bounding boxes with 3 steps, following original ssd paper suggestion
-        # first one find a match for each ground truth box
-        # second one find a match for each default box
-        # third one put together results from previous steps, removing possible duplicates coming from the union operation
-
-        # step 1 - find the best match between each ground truth box and all default bounding boxes
-        # note that the output shape will be (num ground truth boxes with iou > 0 with at least one default box, 2)
-        # this matrix-like tensor contains indexes for default boxes and ground truth boxes
-        indexes_match_ground_truth = tf.stack([tf.math.argmax(iou, axis=0, output_type=tf.dtypes.int32), tf.range(len(xmin_boxes_ground_truth))], axis=1)
-        indexes_match_ground_truth = tf.boolean_mask(tensor=indexes_match_ground_truth, mask=tf.math.greater(tf.math.reduce_max(iou, axis=0), 0.0), axis=0)
-
-        # step 2 - find the best match between each default box and all ground truth bounding boxes
-        # note that the output shape will be (num default truth boxes with iou > threshold with at least one ground truth box, 2)
-        # this matrix-like tensor contains indexes for default boxes, ground truth boxes
-        indexes_match_default = tf.stack([tf.range(len(self.xmin_boxes_default)), tf.math.argmax(iou, axis=1, output_type=tf.dtypes.int32)], axis=1)
-        indexes_match_default = tf.boolean_mask(
-            tensor=indexes_match_default,
-            mask=tf.math.greater(tf.math.reduce_max(iou, axis=1), self.iou_threshold),
-            axis=0
-        )
+    def _encode_ground_truth_labels_boxes_padded(
+            self,
+            labels_ground_truth: tf.Tensor,
+            xmin_boxes_ground_truth: tf.Tensor,
+            ymin_boxes_ground_truth: tf.Tensor,
+            xmax_boxes_ground_truth: tf.Tensor,
+            ymax_boxes_ground_truth: tf.Tensor,
+            augment_with_horizontal_flip: bool
+        ) -> tuple[tf.Tensor, tf.Tensor]:
+        """
+        encode ground truth data padded to max_boxes_ground_truth, using this instance default bounding boxes, compiled with xla (see _encode_padded_impl)
 
-        # step 3 - put all best matches together, removing possible duplicates
-        indexes_match, _ = tf.raw_ops.UniqueV2(x=tf.concat([indexes_match_ground_truth, indexes_match_default], axis=0), axis=[0])
+        Args:
+            labels_ground_truth (tf.Tensor): ground truth labels, with shape (max_boxes_ground_truth,)
+            xmin_boxes_ground_truth (tf.Tensor): ground truth boxes xmin coordinates, with shape (max_boxes_ground_truth,)
+            ymin_boxes_ground_truth (tf.Tensor): ground truth boxes ymin coordinates, with shape (max_boxes_ground_truth,)
+            xmax_boxes_ground_truth (tf.Tensor): ground truth boxes xmax coordinates, with shape (max_boxes_ground_truth,)
+            ymax_boxes_ground_truth (tf.Tensor): ground truth boxes ymax coordinates, with shape (max_boxes_ground_truth,)
+            augment_with_horizontal_flip (bool): pass True if horizontal flip should be applied to input boxes, otherwise False
 
-        # get the class labels for each best match and one-hot encode them (0 is reserved for the background class)
-        labels_match = tf.gather(labels_ground_truth, indexes_match[:, 1])
-        labels_match = tf.one_hot(labels_match, self.num_classes)
+        Returns:
+            tuple[tf.Tensor, tf.Tensor]: encoded labels and offsets, with shape (total default boxes, num classes) and (total default boxes, 4)
+        """
 
-        # convert all bounding boxes coordinates from corners to centroids
-        centroids_default_center_x, centroids_default_center_y, centroids_default_width, centroids_default_height = self._coordinates_corners_to_centroids(
-            xmin=tf.gather(self.xmin_boxes_default, indexes_match[:, 0]),
-            ymin=tf.gather(self.ymin_boxes_default, indexes_match[:, 0]),
-            xmax=tf.gather(self.xmax_boxes_default, indexes_match[:, 0]),
-            ymax=tf.gather(self.ymax_boxes_default, indexes_match[:, 0]),
-        )
-        centroids_ground_truth_center_x, centroids_ground_truth_center_y, centroids_ground_truth_width, centroids_ground_truth_height = self._coordinates_corners_to_centroids(
-            xmin=tf.gather(xmin_boxes_ground_truth, indexes_match[:, 1]),
-            ymin=tf.gather(ymin_boxes_ground_truth, indexes_match[:, 1]),
-            xmax=tf.gather(xmax_boxes_ground_truth, indexes_match[:, 1]),
-            ymax=tf.gather(ymax_boxes_ground_truth, indexes_match[:, 1]),
+        return _encode_padded_impl(self._encoding_constants(), labels_ground_truth, xmin_boxes_ground_truth, ymin_boxes_ground_truth, xmax_boxes_ground_truth, ymax_boxes_ground_truth, augment_with_horizontal_flip)
+
+    def _parse_example(self, example_proto: tf.Tensor) -> tuple[tf.Tensor, tf.Tensor, tuple[tf.Tensor, tf.Tensor, tf.Tensor, tf.Tensor, tf.Tensor]]:
+        """
+        parse a serialized tfrecord example, as written by build_tfrecords, without decoding image and segmentation mask\n
+        ground truth labels and boxes are returned as tensors (padded to max_boxes_ground_truth if jit_compile it's True), so the dataset can cache them already parsed\n
+        if jit_compile it's True and the example has more than max_boxes_ground_truth ground truth boxes an InvalidArgumentError it's raised
+
+        Args:
+            example_proto (tf.Tensor): serialized tf.train.Example with image, segmentation mask, labels and boxes
+
+        Returns:
+            tuple[tf.Tensor, tf.Tensor, tuple[tf.Tensor, tf.Tensor, tf.Tensor, tf.Tensor, tf.Tensor]]:
+                png encoded image, png encoded segmentation mask and ground truth (labels, xmin, ymin, xmax, ymax)
+        """
+
+        # parse the example
+        example = tf.io.parse_single_example(example_proto, features=_TFRECORD_FEATURES)
+
+        # ground truth labels and boxes
+        labels_boxes = (tf.cast(example['labels'], dtype=tf.int32), example['xmin'], example['ymin'], example['xmax'], example['ymax'])
+
+        # pad ground truth labels and boxes to a fixed number of boxes, needed by the xla compiled encoding
+        # ground truth boxes must never be dropped, so samples with too many boxes raise an error
+        if self.jit_compile:
+            num_boxes_ground_truth = tf.shape(labels_boxes[0])[0]
+            assert_num_boxes_ground_truth = tf.debugging.assert_less_equal(
+                num_boxes_ground_truth,
+                self.max_boxes_ground_truth,
+                message='sample with more ground truth boxes than max_boxes_ground_truth, increase it or set jit_compile to False'
+            )
+            with tf.control_dependencies([assert_num_boxes_ground_truth]):
+                num_boxes_padding = self.max_boxes_ground_truth - num_boxes_ground_truth
+            labels_boxes = tuple(
+                tf.ensure_shape(
+                    tf.pad(values, paddings=[[0, num_boxes_padding]], constant_values=padding_value),
+                    shape=[self.max_boxes_ground_truth]
+                )
+                for values, padding_value in zip(labels_boxes, (0, *(_PADDING_BOXES_COORDINATE,) * 4))
+            )
+
+        return example['image/encoded'], example['mask/encoded'], labels_boxes
+
+    def _read_example(
+            self,
+            image_encoded: tf.Tensor,
+            mask_encoded: tf.Tensor,
+            labels_boxes: tuple[tf.Tensor, tf.Tensor, tf.Tensor, tf.Tensor, tf.Tensor]
+        ) -> tuple[tf.Tensor, tf.Tensor, tuple[tf.Tensor, tf.Tensor, tf.Tensor, tf.Tensor, tf.Tensor], tf.Tensor]:
+        """
+        decode a parsed example, as returned by _parse_example, applying the random horizontal flip to image and segmentation mask\n
+        ground truth labels and boxes are returned as they are, the flip it's applied to them during the encoding process
+
+        Args:
+            image_encoded (tf.Tensor): png encoded image
+            mask_encoded (tf.Tensor): png encoded segmentation mask
+            labels_boxes (tuple[tf.Tensor, tf.Tensor, tf.Tensor, tf.Tensor, tf.Tensor]): ground truth (labels, xmin, ymin, xmax, ymax)
+
+        Returns:
+            tuple[tf.Tensor, tf.Tensor, tuple[tf.Tensor, tf.Tensor, tf.Tensor, tf.Tensor, tf.Tensor], tf.Tensor]:
+                image, segmentation mask, ground truth (labels, xmin, ymin, xmax, ymax) and the horizontal flip flag
+        """
+
+        # decode the image, it's kept as uint8 to reduce the host to device transfer (it's cast to float inside the model)
+        image = tf.image.decode_png(image_encoded, channels=3)
+
+        # decode the segmentation mask, ignoring transparency channel in the png, one hot encode the classes, squeeze out unwanted dimension
+        mask = tf.image.decode_png(mask_encoded, channels=1)
+        mask = tf.one_hot(mask, depth=self.num_classes, dtype=tf.float32)
+        mask = tf.squeeze(mask, axis=2)
+
+        # horizontal random flip
+        # this must determined in advance because the encoding process of the input bounding boxes it's in a separate method
+        # note: it's kept as a boolean tensor, so the graph doesn't need to be traced again for each flip outcome
+        augment_with_horizontal_flip = tf.math.logical_and(
+            tf.constant(self.augmentation_horizontal_flip, dtype=tf.bool),
+            tf.math.greater_equal(tf.random.uniform(shape=[], minval=0, maxval=1), 0.5)
         )
 
-        # calculate centroids offsets between ground truth and default boxes and standardize them
-        # for standardization we are assuming that the mean zero and standard deviation given as input
-        center_x_offsets = (centroids_ground_truth_center_x - centroids_default_center_x) / centroids_default_width / self.standard_deviation_center_x_offsets
-        center_y_offsets = (centroids_ground_truth_center_y - centroids_default_center_y) / centroids_default_height / self.standard_deviation_center_y_offsets
-        width_offsets = tf.math.log(centroids_ground_truth_width / centroids_default_width + 1.0) / self.standard_deviation_width_offsets
-        height_offsets = tf.math.log(centroids_ground_truth_height / centroids_default_height + 1.0) / self.standard_deviation_height_offsets
-        
-        # ground truth data properly encoded
-        # if a default bounding box was matched with ground truth, then proper labels and offsets centroids coordinates are assigned
-        # otherwise background labels and zero offsets centroid coordinates are assigned
-        ground_truth_encoded = tf.concat(
-            values=[
-                # all default bounding boxes are initially assigned to background class
-                tf.ones(shape=(len(self.xmin_boxes_default), 1), dtype=tf.float32),
-                # the remaining classes and offsets coordinates are equal to zero, becase all default bounding boxes are initially assigned to background class
-                # note that the num_classes + 3 it's right, because we have previously created the class labels for background class
-                tf.zeros(shape=(len(self.xmin_boxes_default), self.num_classes + 3), dtype=tf.float32)
-            ],
-            axis=1
-        )        
-
-        # update with proper values the indexes where a default bounding box matched a ground truth box
-        ground_truth_encoded = tf.tensor_scatter_nd_update(
-            tensor=ground_truth_encoded,
-            indices=tf.expand_dims(indexes_match[:, 0], axis=1),
-            updates=tf.concat(
-                values=[
-                    labels_match,
-                    tf.expand_dims(center_x_offsets, axis=1),
-                    tf.expand_dims(center_y_offsets, axis=1),
-                    tf.expand_dims(width_offsets, axis=1),
-                    tf.expand_dims(height_offsets, axis=1),
-                ],
-                axis=1)
+        # augmentation - horizontal flip
+        image, mask = tf.cond(
+            augment_with_horizontal_flip,
+            lambda: (tf.image.flip_left_right(image), tf.image.flip_left_right(mask)),
+            lambda: (image, mask)
         )
 
-        return ground_truth_encoded[:, :-4], ground_truth_encoded[:, -4:]
+        return image, mask, labels_boxes, augment_with_horizontal_flip
 
-    def read_and_encode(
-            self,
-            path_file_image: str,
-            path_file_mask: str,
-            path_file_labels_boxes: str,
-        ) -> tuple[tf.Tensor, dict[str, tf.Tensor]]:
+    @tf.function
+    def read_and_encode(self, example_proto: tf.Tensor) -> tuple[tf.Tensor, dict[str, tf.Tensor]]:
         """
-        read and encode ground truth data
+        read and encode ground truth data from a serialized tfrecord example, as written by build_tfrecords
 
         Args:
-            path_file_image (str): path and filename for input image
-            path_file_mask (str): path and filename for ground truth segmentation mask
-            path_file_labels_boxes (str): path and filename for ground truth labels and boxes
+            example_proto (tf.Tensor): serialized tf.train.Example with image, segmentation mask, labels and boxes
 
         Returns:
             tuple[tf.Tensor, dict[str, tf.Tensor]]:
@@ -321,31 +453,185 @@ class DataEncoderDecoder:
                 keep in mind that the targets dictionary keys should match the output layers names in the network, in order to get the proper "y_true" data in the corresponding loss
         """
 
-        # read the image
-        image = tf.io.read_file(path_file_image)
-        image = tf.image.decode_png(image, channels=3)
-        image = tf.cast(image, dtype=tf.float32)
+        # parse, read and encode the example
+        return self._encode_example(*self._read_example(*self._parse_example(example_proto)))
 
-        # read the segmentation mask, ignoring transparency channel in the png, one hot encode the classes, squeeze out unwanted dimension
-        mask = tf.io.read_file(path_file_mask)
-        mask = tf.image.decode_png(mask, channels=1)
+    @tf.function
+    def read_encoded(self, example_proto: tf.Tensor) -> tuple[tf.Tensor, dict[str, tf.Tensor]]:
+        """
+        read ground truth data from a serialized tfrecord example, with labels and boxes already encoded offline by build_tfrecords\n
+        no encoding it's done here, so horizontal flip augmentation it's not applied
+
+        Args:
+            example_proto (tf.Tensor): serialized tf.train.Example with image, segmentation mask, encoded labels and boxes
+
+        Returns:
+            tuple[tf.Tensor, dict[str, tf.Tensor]]: a tuple containing data in form of (inputs, targets), same as read_and_encode
+        """
+
+        # parse the example
+        example = tf.io.parse_single_example(
+            example_proto,
+            features={
+                'image/encoded': _TFRECORD_FEATURES['image/encoded'],
+                'mask/encoded': _TFRECORD_FEATURES['mask/encoded'],
+                'labels/encoded': tf.io.FixedLenFeature(shape=[self.num_boxes_default, self.num_classes], dtype=tf.float32),
+                'boxes/encoded': tf.io.FixedLenFeature(shape=[self.num_boxes_default, 4], dtype=tf.float32),
+            }
+        )
+
+        # decode the image, it's kept as uint8 to reduce the host to device transfer (it's cast to float inside the model)
+        image = tf.image.decode_png(example['image/encoded'], channels=3)
+
+        # decode the segmentation mask, ignoring transparency channel in the png, one hot encode the classes, squeeze out unwanted dimension
+        mask = tf.image.decode_png(example['mask/encoded'], channels=1)
         mask = tf.one_hot(mask, depth=self.num_classes, dtype=tf.float32)
         mask = tf.squeeze(mask, axis=2)
-        
-        # horizontal random flip
-        # this must determined in advance because the encoding process of the input bounding boxes it's in a separate method
-        augment_with_horizontal_flip = True if self.augmentation_horizontal_flip and tf.random.uniform(shape=[], minval=0, maxval=1) >= 0.5 else False
 
-        # augmentation - horizontal flip
-        if augment_with_horizontal_flip:
-            image = tf.image.flip_left_right(image)
-            mask = tf.image.flip_left_right(mask)
+        return image, {'output-mask': mask, 'output-labels': example['labels/encoded'], 'output-boxes': example['boxes/encoded']}
+
+    def _encode_example(
+            self,
+            image: tf.Tensor,
+            mask: tf.Tensor,
+            labels_boxes: tuple[tf.Tensor, tf.Tensor, tf.Tensor, tf.Tensor, tf.Tensor],
+            augment_with_horizontal_flip: tf.Tensor
+        ) -> tuple[tf.Tensor, dict[str, tf.Tensor]]:
+        """
+        encode ground truth data for a single example, as returned by _read_example
+
+        Args:
+            image (tf.Tensor): image
+            mask (tf.Tensor): segmentation mask
+            labels_boxes (tuple[tf.Tensor, tf.Tensor, tf.Tensor, tf.Tensor, tf.Tensor]): ground truth (labels, xmin, ymin, xmax, ymax)
+            augment_with_horizontal_flip (tf.Tensor): horizontal flip flag
+
+        Returns:
+            tuple[tf.Tensor, dict[str, tf.Tensor]]: a tuple containing data in form of (inputs, targets), same as read_and_encode
+        """
 
         # encode ground truth labels and bounding boxes, applying horizontal flip if needed
-        labels, boxes = self._encode_ground_truth_labels_boxes(path_file_labels_boxes=path_file_labels_boxes, augment_with_horizontal_flip=augment_with_horizontal_flip)
+        labels, boxes = self._encode(*labels_boxes, augment_with_horizontal_flip)
 
         return image, {'output-mask': mask, 'output-labels': labels, 'output-boxes': boxes}
-    
+
+    def _encode_batch(
+            self,
+            image_batch: tf.Tensor,
+            mask_batch: tf.Tensor,
+            labels_boxes_batch: tuple[tf.Tensor, tf.Tensor, tf.Tensor, tf.Tensor, tf.Tensor],
+            augment_with_horizontal_flip_batch: tf.Tensor
+        ) -> tuple[tf.Tensor, dict[str, tf.Tensor]]:
+        """
+        encode ground truth data for a whole batch, vectorizing the xla compiled encoding process over the batch dimension (used only if jit_compile it's True)\n
+        ground truth labels and boxes are expected padded to max_boxes_ground_truth, as returned by _parse_example\n
+        note: the dynamic encoding (jit_compile False) it's data dependent (iou loop, variable size gathers) and can't be vectorized, it's mapped on single examples instead
+
+        Args:
+            image_batch (tf.Tensor): image batch
+            mask_batch (tf.Tensor): segmentation mask batch
+            labels_boxes_batch (tuple[tf.Tensor, tf.Tensor, tf.Tensor, tf.Tensor, tf.Tensor]): padded ground truth (labels, xmin, ymin, xmax, ymax), each with shape (batch, max_boxes_ground_truth)
+            augment_with_horizontal_flip_batch (tf.Tensor): horizontal flip flags, with shape (batch,)
+
+        Returns:
+            tuple[tf.Tensor, dict[str, tf.Tensor]]: a tuple containing data in form of (inputs, targets), same as read_and_encode but batched
+        """
+
+        # encode ground truth labels and bounding boxes for each sample of the batch, static shapes only so it's fully vectorized
+        labels_batch, boxes_batch = tf.vectorized_map(
+            fn=lambda sample: self._encode_ground_truth_labels_boxes_padded(*sample),
+            elems=(*labels_boxes_batch, augment_with_horizontal_flip_batch)
+        )
+
+        return image_batch, {'output-mask': mask_batch, 'output-labels': labels_batch, 'output-boxes': boxes_batch}
+
+    def build_dataset(
+            self,
+            path_files_tfrecords: Union[str, list[str]],
+            batch_size: int,
+            training: bool,
+            shuffle_buffer_size: int = 1024,
+            prefetch_to_device: bool = False,
+            encoded_offline: bool = False
+        ) -> tf.data.Dataset:
+        """
+        build the tensorflow data pipeline reading tfrecord files written by build_tfrecords\n
+        files are read in parallel, examples are parsed (ground truth labels and boxes are loaded as tensors) and cached in memory after the first epoch,
+        then examples are shuffled (only for training), decoded in parallel, encoded (for the whole batch at once if jit_compile it's True, otherwise for each example in parallel), batched and prefetched\n
+        the cache it's placed before decoding, so the random horizontal flip it's still different at each epoch\n
+        rgb channels augmentation it's not part of the pipeline, it's done inside the model (see build_augmentation_rgb_channels)
+
+        Args:
+            path_files_tfrecords (Union[str, list[str]]): glob pattern or list of paths and filenames for the tfrecord files
+            batch_size (int): batch size
+            training (bool): if True files and examples are shuffled and the order it's not deterministic
+            shuffle_buffer_size (int, optional): buffer size for examples shuffling. Defaults to 1024.
+            prefetch_to_device (bool, optional): if True and a gpu is available, batches are prefetched directly on the first gpu. Defaults to False.
+            encoded_offline (bool, optional): if True labels and boxes encoded by build_tfrecords are read (see read_encoded), the encoding process it's skipped. Defaults to False.
+
+        Returns:
+            tf.data.Dataset: dataset with elements in form of (inputs, targets), as required by .fit method of a tensorflow keras Model class
+        """
+
+        # static optimizations of the pipeline
+        options = tf.data.Options()
+        options.experimental_optimization.map_fusion = True
+        options.experimental_optimization.map_and_batch_fusion = True
+        options.experimental_optimization.parallel_batch = True
+        options.deterministic = not training
+
+        # read tfrecord files in parallel
+        ds = (
+            tf.data.Dataset.list_files(path_files_tfrecords, shuffle=training)
+            .interleave(tf.data.TFRecordDataset, num_parallel_calls=tf.data.AUTOTUNE, deterministic=not training)
+        )
+
+        # parse ground truth labels and boxes once, so the cached examples don't need to be parsed again at each epoch
+        if not encoded_offline:
+            ds = ds.map(self._parse_example, num_parallel_calls=tf.data.AUTOTUNE)
+
+        # cache the examples (serialized, or parsed)
+        ds = ds.cache()
+
+        # shuffle examples
+        if training:
+            ds = ds.shuffle(buffer_size=shuffle_buffer_size, reshuffle_each_iteration=True)
+
+        # decode examples with labels and boxes already encoded, batch and prefetch
+        if encoded_offline:
+            ds = (
+                ds.map(self.read_encoded, num_parallel_calls=tf.data.AUTOTUNE)
+                .batch(batch_size=batch_size)
+                .prefetch(buffer_size=tf.data.AUTOTUNE)
+                .with_options(options)
+            )
+
+        # decode examples, batch them (ground truth labels and boxes are already padded), encode batches with xla and prefetch
+        elif self.jit_compile:
+            ds = (
+                ds.map(self._read_example, num_parallel_calls=tf.data.AUTOTUNE)
+                .batch(batch_size=batch_size)
+                .map(self._encode_batch, num_parallel_calls=tf.data.AUTOTUNE)
+                .prefetch(buffer_size=tf.data.AUTOTUNE)
+                .with_options(options)
+            )
+
+        # decode and encode examples in parallel, batch and prefetch
+        else:
+            ds = (
+                ds.map(self._read_example, num_parallel_calls=tf.data.AUTOTUNE)
+                .map(self._encode_example, num_parallel_calls=tf.data.AUTOTUNE)
+                .batch(batch_size=batch_size)
+                .prefetch(buffer_size=tf.data.AUTOTUNE)
+                .with_options(options)
+            )
+
+        # prefetch directly on the gpu
+        if prefetch_to_device and tf.config.list_logical_devices('GPU'):
+            ds = ds.apply(tf.data.experimental.prefetch_to_device(tf.config.list_logical_devices('GPU')[0].name))
+
+        return ds
+
     def decode_to_centroids(
             self,
             offsets_centroids: tf.Tensor,
@@ -364,28 +650,15 @@ class DataEncoderDecoder:
             Union[tuple[tf.Tensor, tf.Tensor, tf.Tensor, tf.Tensor], tf.Tensor]: decoded centroids coordinates
         """
  
-        # split the offsets centroids coordinates
-        center_x_offsets, center_y_offsets, width_offsets, height_offsets = [tf.squeeze(offsets_coordinates) for offsets_coordinates in tf.split(value=offsets_centroids, num_or_size_splits=4, axis=1)]
-
-        # decode offsets to centroids coordinates
-        center_x = center_x_offsets * self.standard_deviation_center_x_offsets * self.width_boxes_default + self.center_x_boxes_default
-        center_y = center_y_offsets * self.standard_deviation_center_y_offsets * self.height_boxes_default + self.center_y_boxes_default
-        width = (tf.math.exp(width_offsets * self.standard_deviation_width_offsets) - 1.0) * self.width_boxes_default
-        height = (tf.math.exp(height_offsets * self.standard_deviation_height_offsets) - 1.0) * self.height_boxes_default
-
-        # set to zero decoded coordinates for invalid boxes (default bounding boxes that were not matched to any ground truth)
-        sum_of_coordinates_abs_value = tf.math.reduce_sum(tf.math.abs(offsets_centroids), axis=-1)
-        not_background = tf.cast(tf.math.greater(sum_of_coordinates_abs_value, 0.0), dtype=tf.float32)
-        center_x = center_x * not_background
-        center_y = center_y * not_background
-        width = width * not_background
-        height = height * not_background
+        # decode offsets to centroids coordinates, with the function shared by all instances (compiled with xla if requested)
+        decode_to_centroids = _decode_to_centroids_impl if self.jit_compile else _decode_to_centroids_impl.python_function
+        centroids = decode_to_centroids(offsets_centroids, self._centroids_boxes_default, self._standard_deviations_centroids_offsets)
 
         # return data in desired format
         if output_decoded_centroids_separately:
-            return center_x, center_y, width, height
+            return tuple(tf.unstack(centroids, num=4, axis=-1))
         else:
-            return tf.stack([center_x, center_y, width, height], axis=1)
+            return centroids
 
     def decode_to_corners(
             self,
@@ -405,65 +678,428 @@ class DataEncoderDecoder:
             Union[tuple[tf.Tensor, tf.Tensor, tf.Tensor, tf.Tensor], tf.Tensor]: decoded corners coordinates
         """        
 
-        # decode offsets to centroids coordinates
-        center_x, center_y, width, height = self.decode_to_centroids(offsets_centroids=offsets_centroids, output_decoded_centroids_separately=True)
-
-        # convert to corners coordinates
-        xmin, ymin, xmax, ymax = self._coordinates_centroids_to_corners(
-            center_x=center_x,
-            center_y=center_y,
-            width=width,
-            height=height
-        )
-
-        # set to zero decoded coordinates for invalid boxes (default bounding boxes that were not matched to any ground truth)
-        centroids = tf.stack([center_x, center_y, width, height], axis=1)
-        sum_of_coordinates_abs_value = tf.math.reduce_sum(tf.math.abs(centroids), axis=-1)
-        not_background = tf.cast(tf.math.greater(sum_of_coordinates_abs_value, 0.0), dtype=tf.float32)
-        xmin = xmin * not_background
-        ymin = ymin * not_background
-        xmax = xmax * not_background
-        ymax = ymax * not_background
+        # decode offsets to corners coordinates, with the function shared by all instances (compiled with xla if requested)
+        decode_to_corners = _decode_to_corners_impl if self.jit_compile else _decode_to_corners_impl.python_function
+        corners = decode_to_corners(offsets_centroids, self._centroids_boxes_default, self._standard_deviations_centroids_offsets)
 
         # return data in desired format
         if output_decoded_corners_separately:
-            return xmin, ymin, xmax, ymax
+            return tuple(tf.unstack(corners, num=4, axis=-1))
         else:
-            return tf.stack([xmin, ymin, xmax, ymax], axis=1)
+            return corners
+
+def _flip_boxes_ground_truth(
+        xmin_boxes_ground_truth: tf.Tensor,
+        ymin_boxes_ground_truth: tf.Tensor,
+        xmax_boxes_ground_truth: tf.Tensor,
+        ymax_boxes_ground_truth: tf.Tensor,
+        augment_with_horizontal_flip: tf.Tensor,
+        image_width: tf.Tensor
+    ) -> tuple[tf.Tensor, tf.Tensor, tf.Tensor]:
+    """
+    horizontally flip ground truth boxes if requested and calculate their area, shared by _encode_impl and _encode_padded_impl\n
+    branchless: coordinates are mirrored with a sign and an offset, mirroring swaps xmin and xmax so they are sorted again with min and max
+
+    Args:
+        xmin_boxes_ground_truth (tf.Tensor): ground truth boxes xmin coordinates
+        ymin_boxes_ground_truth (tf.Tensor): ground truth boxes ymin coordinates
+        xmax_boxes_ground_truth (tf.Tensor): ground truth boxes xmax coordinates
+        ymax_boxes_ground_truth (tf.Tensor): ground truth boxes ymax coordinates
+        augment_with_horizontal_flip (tf.Tensor): pass True if horizontal flip should be applied to input boxes, otherwise False
+        image_width (tf.Tensor): input image width
 
-def augmentation_rgb_channels(image_batch: tf.Tensor, targets_batch: dict[str, tf.Tensor]) -> tuple[tf.Tensor, dict[str, tf.Tensor]]:
+    Returns:
+        tuple[tf.Tensor, tf.Tensor, tf.Tensor]: xmin and xmax coordinates (flipped if requested) and area for ground truth boxes
+    """
+
+    # augmentation - horizontal flip
+    flip_sign = tf.where(augment_with_horizontal_flip, -1.0, 1.0)
+    flip_offset = tf.where(augment_with_horizontal_flip, image_width, 0.0)
+    xmin_boxes_ground_truth, xmax_boxes_ground_truth = (
+        tf.math.minimum(flip_offset + flip_sign * xmin_boxes_ground_truth, flip_offset + flip_sign * xmax_boxes_ground_truth),
+        tf.math.maximum(flip_offset + flip_sign * xmin_boxes_ground_truth, flip_offset + flip_sign * xmax_boxes_ground_truth)
+    )
+
+    # calculate area for ground truth bounding boxes
+    boxes_area_ground_truth = (xmax_boxes_ground_truth - xmin_boxes_ground_truth + 1.0) * (ymax_boxes_ground_truth - ymin_boxes_ground_truth + 1.0)
+
+    return xmin_boxes_ground_truth, xmax_boxes_ground_truth, boxes_area_ground_truth
+
+# input signature shared by the encoding functions
+# default bounding boxes are passed as arguments, so a single trace it's shared by all DataEncoderDecoder instances
+# note: they are grouped in a nested _EncodingConstants spec, so they are matched by name and not by position
+# note: the price it's that default bounding boxes values are no longer graph constants, so they can't be constant folded
+# note: read_and_encode and read_encoded are still traced for each instance (they depend on instance settings), but they only call the shared functions
+_ENCODING_INPUT_SIGNATURE = [
+    _EncodingConstants(
+        xmin_boxes_default=tf.TensorSpec(shape=[None], dtype=tf.float32),
+        ymin_boxes_default=tf.TensorSpec(shape=[None], dtype=tf.float32),
+        xmax_boxes_default=tf.TensorSpec(shape=[None], dtype=tf.float32),
+        ymax_boxes_default=tf.TensorSpec(shape=[None], dtype=tf.float32),
+        ymin_ymax_area_boxes_default=tf.TensorSpec(shape=[None, 3], dtype=tf.float32),
+        centroids_boxes_default=tf.TensorSpec(shape=[None, 4], dtype=tf.float32),
+        inv_w_std_x=tf.TensorSpec(shape=[None], dtype=tf.float32),
+        inv_h_std_y=tf.TensorSpec(shape=[None], dtype=tf.float32),
+        inv_std_w=tf.TensorSpec(shape=[], dtype=tf.float32),
+        inv_std_h=tf.TensorSpec(shape=[], dtype=tf.float32),
+        labels_one_hot=tf.TensorSpec(shape=[None, None], dtype=tf.float32),
+        image_width=tf.TensorSpec(shape=[], dtype=tf.float32),
+        iou_threshold=tf.TensorSpec(shape=[], dtype=tf.float32)
+    ),
+    tf.TensorSpec(shape=[None], dtype=tf.int32),
+    tf.TensorSpec(shape=[None], dtype=tf.float32),
+    tf.TensorSpec(shape=[None], dtype=tf.float32),
+    tf.TensorSpec(shape=[None], dtype=tf.float32),
+    tf.TensorSpec(shape=[None], dtype=tf.float32),
+    tf.TensorSpec(shape=[], dtype=tf.bool)
+]
+
+@tf.function(input_signature=_ENCODING_INPUT_SIGNATURE)
+def _encode_impl(
+        encoding_constants: _EncodingConstants,
+        labels_ground_truth: tf.Tensor,
+        xmin_boxes_ground_truth: tf.Tensor,
+        ymin_boxes_ground_truth: tf.Tensor,
+        xmax_boxes_ground_truth: tf.Tensor,
+        ymax_boxes_ground_truth: tf.Tensor,
+        augment_with_horizontal_flip: bool
+    ) -> tuple[tf.Tensor, tf.Tensor]:
     """
-    apply rgb channels augmentation to the image batch
-    hue, saturation, contrast and brightness changes are randomly applied within a reasonable range
-    transformed values are clipped between 0 and 1
+    encode ground truth data as required by a single-shot-detector network
+    this means assign labels and calculate standardized offsets for each default bounding boxes
+    it's traced once as a tensorflow graph and shared by all DataEncoderDecoder instances, default bounding boxes are passed as arguments (see _EncodingConstants)
 
     Args:
-        image_batch (tf.Tensor): image batch tecnsor
-        mask_batch (tf.Tensor): segmentation mask tensor
-        labels_boxes_batch (tf.Tensor): encoded labels and bounding boxes tensor
+        encoding_constants (_EncodingConstants): values related to default bounding boxes and settings (see DataEncoderDecoder._encoding_constants)
+        labels_ground_truth (tf.Tensor): ground truth labels
+        xmin_boxes_ground_truth (tf.Tensor): ground truth boxes xmin coordinates
+        ymin_boxes_ground_truth (tf.Tensor): ground truth boxes ymin coordinates
+        xmax_boxes_ground_truth (tf.Tensor): ground truth boxes xmax coordinates
+        ymax_boxes_ground_truth (tf.Tensor): ground truth boxes ymax coordinates
+        augment_with_horizontal_flip (bool): pass True if horizontal flip should be applied to input boxes, otherwise False
 
     Returns:
-        tuple[tf.Tensor, dict[str, tf.Tensor]]: 
-        a tuple containing data in form of (inputs, targets)
-        inputs it's the image_batch augmented with rgb channels transformations, targets it's the targets_batch unchanged
+        tuple[tf.Tensor, tf.Tensor]:
+            encoded data, a tuple with two tensor, respectively labels and offsets, with shape (total default boxes, num classes) and (total default boxes, 4)
+            labels are one hot encoded
+            offsets between ground truth and default bounding boxes are expressed as centroids offsets (center_x_offsets, center_y_offsets, width_offsets, height_offsets)
     """
 
-    # small hue change
-    image_batch = tf.image.random_hue(image_batch, max_delta=0.05)
+    # augmentation - horizontal flip, and area for ground truth bounding boxes
+    xmin_boxes_ground_truth, xmax_boxes_ground_truth, boxes_area_ground_truth = _flip_boxes_ground_truth(
+        xmin_boxes_ground_truth=xmin_boxes_ground_truth,
+        ymin_boxes_ground_truth=ymin_boxes_ground_truth,
+        xmax_boxes_ground_truth=xmax_boxes_ground_truth,
+        ymax_boxes_ground_truth=ymax_boxes_ground_truth,
+        augment_with_horizontal_flip=augment_with_horizontal_flip,
+        image_width=encoding_constants.image_width
+    )
+
+    # total number of classes, default and ground truth bounding boxes
+    num_classes = tf.shape(encoding_constants.labels_one_hot)[0]
+    num_boxes_default = tf.shape(encoding_constants.xmin_boxes_default)[0]
+    num_boxes_ground_truth = tf.shape(xmin_boxes_ground_truth)[0]
+
+    def match_ground_truth_box(
+            index_ground_truth: tf.Tensor,
+            best_iou_default: tf.Tensor,
+            best_index_ground_truth: tf.Tensor,
+            best_iou_ground_truth: tf.TensorArray,
+            best_index_default: tf.TensorArray
+        ) -> tuple[tf.Tensor, tf.Tensor, tf.Tensor, tf.TensorArray, tf.TensorArray]:
+        # width of intersections between all default bounding boxes and the current ground truth box
+        # default bounding boxes without a positive width can't overlap the ground truth box, so they are skipped
+        # note: surviving default boxes are selected with int32 indexes and gathers, instead of boolean masks (int64 indexes under the hood)
+        width_intersection = tf.math.minimum(encoding_constants.xmax_boxes_default, xmax_boxes_ground_truth[index_ground_truth]) - tf.math.maximum(encoding_constants.xmin_boxes_default, xmin_boxes_ground_truth[index_ground_truth]) + 1.0
+        indexes_overlap = tf.cast(tf.where(tf.math.greater(width_intersection, 0.0))[:, 0], dtype=tf.int32)
+        width_intersection = tf.gather(width_intersection, indexes_overlap)
+        ymin_boxes_overlap, ymax_boxes_overlap, boxes_area_overlap = tf.unstack(tf.gather(encoding_constants.ymin_ymax_area_boxes_default, indexes_overlap), axis=1)
+
+        # height of intersections, calculated only for the surviving default bounding boxes
+        height_intersection = tf.math.maximum(
+            0.0,
+            tf.math.minimum(ymax_boxes_overlap, ymax_boxes_ground_truth[index_ground_truth]) -
+            tf.math.maximum(ymin_boxes_overlap, ymin_boxes_ground_truth[index_ground_truth]) + 1.0
+        )
+
+        # intersection over union between the surviving default bounding boxes and the current ground truth box
+        boxes_area_intersection = width_intersection * height_intersection
+        iou = boxes_area_intersection / (boxes_area_overlap + boxes_area_ground_truth[index_ground_truth] - boxes_area_intersection)
+
+        # best default bounding box for the current ground truth box
+        # a trailing zero iou it's appended so that the argmax it's well defined even if no default bounding box overlaps
+        iou_padded = tf.concat([iou, [0.0]], axis=0)
+        indexes_overlap_padded = tf.concat([indexes_overlap, [0]], axis=0)
+        position_best = tf.math.argmax(iou_padded, output_type=tf.dtypes.int32)
+        best_iou_ground_truth = best_iou_ground_truth.write(index_ground_truth, iou_padded[position_best])
+        best_index_default = best_index_default.write(index_ground_truth, indexes_overlap_padded[position_best])
+
+        # best ground truth box for each default bounding box, updated only where the current ground truth box improves the iou
+        # the strict comparison keeps the first ground truth box in case of ties, same as an argmax
+        positions_improved = tf.cast(tf.where(tf.math.greater(iou, tf.gather(best_iou_default, indexes_overlap)))[:, 0], dtype=tf.int32)
+        indexes_improved = tf.expand_dims(tf.gather(indexes_overlap, positions_improved), axis=1)
+        best_index_ground_truth = tf.tensor_scatter_nd_update(
+            tensor=best_index_ground_truth,
+            indices=indexes_improved,
+            updates=tf.fill(dims=tf.shape(indexes_improved)[:1], value=index_ground_truth)
+        )
+        best_iou_default = tf.tensor_scatter_nd_max(tensor=best_iou_default, indices=tf.expand_dims(indexes_overlap, axis=1), updates=iou)
+
+        return index_ground_truth + 1, best_iou_default, best_index_ground_truth, best_iou_ground_truth, best_index_default
+
+    # calculate intersection over union iterating over ground truth boxes (usually just a few) instead of building the full matrix
+    # with shape (num default bounding boxes, num ground truth bounding boxes), only the best matches are kept along the way
+    _, best_iou_default, best_index_ground_truth, best_iou_ground_truth, best_index_default = tf.while_loop(
+        cond=lambda index_ground_truth, *_: tf.math.less(index_ground_truth, num_boxes_ground_truth),
+        body=match_ground_truth_box,
+        loop_vars=(
+            tf.constant(0, dtype=tf.int32),
+            tf.zeros(shape=(num_boxes_default,), dtype=tf.float32),
+            tf.zeros(shape=(num_boxes_default,), dtype=tf.int32),
+            tf.TensorArray(dtype=tf.float32, size=num_boxes_ground_truth, element_shape=()),
+            tf.TensorArray(dtype=tf.int32, size=num_boxes_ground_truth, element_shape=())
+        )
+    )
+    best_iou_ground_truth = best_iou_ground_truth.stack()
+    best_index_default = best_index_default.stack()
+
+    # find best matches between ground truth and default bounding boxes with 3 steps, following original ssd paper suggestion
+    # first one find a match for each ground truth box
+    # second one find a match for each default box
+    # third one put together results from previous steps, keeping a single ground truth box for each default box
+
+    # step 1 - find the best match between each ground truth box and all default bounding boxes
+    # only ground truth boxes with iou > 0 with at least one default box are considered
+    # the result it's scattered on default boxes, if two ground truth boxes share the same best default box the first one it's kept
+    # ground truth boxes index it's used as sentinel for default boxes without a match
+    indexes_forced_ground_truth = tf.cast(tf.where(tf.math.greater(best_iou_ground_truth, 0.0))[:, 0], dtype=tf.int32)
+    indexes_forced_default = tf.expand_dims(tf.gather(best_index_default, indexes_forced_ground_truth), axis=1)
+    index_ground_truth_forced = tf.tensor_scatter_nd_min(
+        tensor=tf.fill(dims=(num_boxes_default,), value=num_boxes_ground_truth),
+        indices=indexes_forced_default,
+        updates=indexes_forced_ground_truth
+    )
+    forced = tf.math.less(index_ground_truth_forced, num_boxes_ground_truth)
+
+    # step 2 - the best match between each default box and all ground truth bounding boxes it's already available from the iou loop
+    # default boxes with iou > threshold with at least one ground truth box are matched
+    matched = tf.math.greater(best_iou_default, encoding_constants.iou_threshold)
+
+    # step 3 - put all best matches together, matches from step 1 override the ones from step 2
+    # note that the output shape will be (num matched default boxes, 2)
+    # this matrix-like tensor contains indexes for default boxes, ground truth boxes
+    best_index_ground_truth = tf.where(forced, index_ground_truth_forced, best_index_ground_truth)
+    indexes_match_default = tf.cast(tf.where(tf.math.logical_or(forced, matched))[:, 0], dtype=tf.int32)
+    indexes_match = tf.stack(
+        values=[
+            indexes_match_default,
+            tf.gather(best_index_ground_truth, indexes_match_default)
+        ],
+        axis=1
+    )
+
+    # get the class labels for each best match and one-hot encode them (0 is reserved for the background class)
+    labels_match = tf.gather(labels_ground_truth, indexes_match[:, 1])
+    labels_match = tf.gather(encoding_constants.labels_one_hot, labels_match)
+
+    # get centroids coordinates for matched default bounding boxes, convert ground truth bounding boxes coordinates from corners to centroids
+    centroids_default_center_x, centroids_default_center_y, centroids_default_width, centroids_default_height = tf.unstack(tf.gather(encoding_constants.centroids_boxes_default, indexes_match[:, 0]), axis=1)
+    centroids_ground_truth_center_x, centroids_ground_truth_center_y, centroids_ground_truth_width, centroids_ground_truth_height = DataEncoderDecoder._coordinates_corners_to_centroids(
+        xmin=tf.gather(xmin_boxes_ground_truth, indexes_match[:, 1]),
+        ymin=tf.gather(ymin_boxes_ground_truth, indexes_match[:, 1]),
+        xmax=tf.gather(xmax_boxes_ground_truth, indexes_match[:, 1]),
+        ymax=tf.gather(ymax_boxes_ground_truth, indexes_match[:, 1]),
+    )
+
+    # calculate centroids offsets between ground truth and default boxes and standardize them
+    # for standardization we are assuming that the mean zero and standard deviation given as input
+    # note: division by default boxes width/height and by standard deviations are folded into the reciprocals calculated in DataEncoderDecoder.__init__
+    center_x_offsets = (centroids_ground_truth_center_x - centroids_default_center_x) * tf.gather(encoding_constants.inv_w_std_x, indexes_match[:, 0])
+    center_y_offsets = (centroids_ground_truth_center_y - centroids_default_center_y) * tf.gather(encoding_constants.inv_h_std_y, indexes_match[:, 0])
+    width_offsets = tf.math.log1p(centroids_ground_truth_width / centroids_default_width) * encoding_constants.inv_std_w
+    height_offsets = tf.math.log1p(centroids_ground_truth_height / centroids_default_height) * encoding_constants.inv_std_h
+
+    # ground truth data properly encoded
+    # if a default bounding box was matched with ground truth, then proper labels and offsets centroids coordinates are assigned
+    # otherwise background labels and zero offsets centroid coordinates are assigned
+    # labels and offsets are scattered directly into zeros, there's no need to build and then update a full tensor
+    indexes_scatter = tf.expand_dims(indexes_match[:, 0], axis=1)
+    labels_encoded = tf.scatter_nd(indices=indexes_scatter, updates=labels_match, shape=tf.stack([num_boxes_default, num_classes]))
+    offsets_encoded = tf.scatter_nd(
+        indices=indexes_scatter,
+        updates=tf.stack([center_x_offsets, center_y_offsets, width_offsets, height_offsets], axis=1),
+        shape=(num_boxes_default, 4)
+    )
+
+    # default bounding boxes without a match (no other class assigned) are assigned to background class
+    labels_encoded = tf.concat([1.0 - tf.math.reduce_sum(labels_encoded[:, 1:], axis=1, keepdims=True), labels_encoded[:, 1:]], axis=1)
+
+    return labels_encoded, offsets_encoded
+
+# note: xla compiles the function for each distinct input shape, ground truth boxes are padded to a fixed number so it happens once per instance settings
+@tf.function(input_signature=_ENCODING_INPUT_SIGNATURE, jit_compile=True)
+def _encode_padded_impl(
+        encoding_constants: _EncodingConstants,
+        labels_ground_truth: tf.Tensor,
+        xmin_boxes_ground_truth: tf.Tensor,
+        ymin_boxes_ground_truth: tf.Tensor,
+        xmax_boxes_ground_truth: tf.Tensor,
+        ymax_boxes_ground_truth: tf.Tensor,
+        augment_with_horizontal_flip: bool
+    ) -> tuple[tf.Tensor, tf.Tensor]:
+    """
+    encode ground truth data as required by a single-shot-detector network, same as _encode_impl but with static shapes only, so it can be compiled with xla\n
+    ground truth boxes are expected padded to max_boxes_ground_truth, with _PADDING_BOXES_COORDINATE as coordinates for padded boxes\n
+    there are no boolean masks, the full iou matrix it's calculated (xla fuses the element-wise operations) and masked values are selected with tf.where
 
-    # small saturation change
-    image_batch = tf.image.random_saturation(image_batch, lower=0.95, upper=1.05) 
+    Args:
+        encoding_constants (_EncodingConstants): values related to default bounding boxes and settings (see DataEncoderDecoder._encoding_constants)
+        labels_ground_truth (tf.Tensor): ground truth labels, with shape (max_boxes_ground_truth,)
+        xmin_boxes_ground_truth (tf.Tensor): ground truth boxes xmin coordinates, with shape (max_boxes_ground_truth,)
+        ymin_boxes_ground_truth (tf.Tensor): ground truth boxes ymin coordinates, with shape (max_boxes_ground_truth,)
+        xmax_boxes_ground_truth (tf.Tensor): ground truth boxes xmax coordinates, with shape (max_boxes_ground_truth,)
+        ymax_boxes_ground_truth (tf.Tensor): ground truth boxes ymax coordinates, with shape (max_boxes_ground_truth,)
+        augment_with_horizontal_flip (bool): pass True if horizontal flip should be applied to input boxes, otherwise False
 
-    # small contrast change
-    image_batch = tf.image.random_contrast(image_batch, lower=0.90, upper=1.10)
+    Returns:
+        tuple[tf.Tensor, tf.Tensor]: encoded labels and offsets, same as _encode_impl
+    """
 
-    # small brightness change
-    image_batch = tf.image.random_brightness(image_batch, max_delta=0.10)
+    # augmentation - horizontal flip, and area for ground truth bounding boxes
+    xmin_boxes_ground_truth, xmax_boxes_ground_truth, boxes_area_ground_truth = _flip_boxes_ground_truth(
+        xmin_boxes_ground_truth=xmin_boxes_ground_truth,
+        ymin_boxes_ground_truth=ymin_boxes_ground_truth,
+        xmax_boxes_ground_truth=xmax_boxes_ground_truth,
+        ymax_boxes_ground_truth=ymax_boxes_ground_truth,
+        augment_with_horizontal_flip=augment_with_horizontal_flip,
+        image_width=encoding_constants.image_width
+    )
+
+    # intersection over union between each default bounding box and all ground truth bounding boxes
+    # note that this is a matrix with shape (num default bounding boxes, max_boxes_ground_truth), padded boxes have zero iou with all default boxes
+    width_intersection = tf.math.maximum(0.0, tf.math.minimum(tf.expand_dims(encoding_constants.xmax_boxes_default, axis=1), xmax_boxes_ground_truth) - tf.math.maximum(tf.expand_dims(encoding_constants.xmin_boxes_default, axis=1), xmin_boxes_ground_truth) + 1.0)
+    height_intersection = tf.math.maximum(0.0, tf.math.minimum(tf.expand_dims(encoding_constants.ymax_boxes_default, axis=1), ymax_boxes_ground_truth) - tf.math.maximum(tf.expand_dims(encoding_constants.ymin_boxes_default, axis=1), ymin_boxes_ground_truth) + 1.0)
+    boxes_area_intersection = width_intersection * height_intersection
+    iou = boxes_area_intersection / (tf.expand_dims(encoding_constants.ymin_ymax_area_boxes_default[:, 2], axis=1) + boxes_area_ground_truth - boxes_area_intersection)
+
+    # step 1 - find the best match between each ground truth box (with iou > 0) and all default bounding boxes
+    # if two ground truth boxes share the same best default box the first one it's kept (argmax returns the first maximum)
+    forced_matrix = tf.math.logical_and(
+        tf.math.equal(tf.expand_dims(tf.range(tf.shape(encoding_constants.xmin_boxes_default)[0]), axis=1), tf.math.argmax(iou, axis=0, output_type=tf.dtypes.int32)),
+        tf.math.greater(tf.math.reduce_max(iou, axis=0), 0.0)
+    )
+    forced = tf.math.reduce_any(forced_matrix, axis=1)
+
+    # step 2 - find the best match between each default box and all ground truth bounding boxes, matched if iou > threshold
+    # step 3 - put all best matches together, matches from step 1 override the ones from step 2
+    index_ground_truth_match = tf.where(
+        forced,
+        tf.math.argmax(tf.cast(forced_matrix, dtype=tf.int32), axis=1, output_type=tf.dtypes.int32),
+        tf.math.argmax(iou, axis=1, output_type=tf.dtypes.int32)
+    )
+    matched = tf.math.logical_or(forced, tf.math.greater(tf.math.reduce_max(iou, axis=1), encoding_constants.iou_threshold))
+
+    # calculate centroids offsets between ground truth and default boxes (for all default boxes) and standardize them
+    # note: division by default boxes width/height and by standard deviations are folded into the reciprocals calculated in DataEncoderDecoder.__init__
+    centroids_ground_truth_center_x, centroids_ground_truth_center_y, centroids_ground_truth_width, centroids_ground_truth_height = DataEncoderDecoder._coordinates_corners_to_centroids(
+        xmin=tf.gather(xmin_boxes_ground_truth, index_ground_truth_match),
+        ymin=tf.gather(ymin_boxes_ground_truth, index_ground_truth_match),
+        xmax=tf.gather(xmax_boxes_ground_truth, index_ground_truth_match),
+        ymax=tf.gather(ymax_boxes_ground_truth, index_ground_truth_match),
+    )
+    offsets_encoded = tf.stack(
+        values=[
+            (centroids_ground_truth_center_x - encoding_constants.centroids_boxes_default[:, 0]) * encoding_constants.inv_w_std_x,
+            (centroids_ground_truth_center_y - encoding_constants.centroids_boxes_default[:, 1]) * encoding_constants.inv_h_std_y,
+            tf.math.log1p(centroids_ground_truth_width / encoding_constants.centroids_boxes_default[:, 2]) * encoding_constants.inv_std_w,
+            tf.math.log1p(centroids_ground_truth_height / encoding_constants.centroids_boxes_default[:, 3]) * encoding_constants.inv_std_h,
+        ],
+        axis=1
+    )
+
+    # default bounding boxes without a match are assigned to background class with zero offsets
+    labels_encoded = tf.where(
+        tf.expand_dims(matched, axis=1),
+        tf.gather(encoding_constants.labels_one_hot, tf.gather(labels_ground_truth, index_ground_truth_match)),
+        encoding_constants.labels_one_hot[0]
+    )
+    offsets_encoded = tf.where(tf.expand_dims(matched, axis=1), offsets_encoded, 0.0)
+
+    return labels_encoded, offsets_encoded
+
+# input signature shared by the decoding functions, offsets can have any number of leading dimensions (e.g. batch)
+_DECODING_INPUT_SIGNATURE = [
+    tf.TensorSpec(shape=None, dtype=tf.float32),
+    tf.TensorSpec(shape=[None, 4], dtype=tf.float32),
+    tf.TensorSpec(shape=[4], dtype=tf.float32)
+]
+
+@tf.function(input_signature=_DECODING_INPUT_SIGNATURE, jit_compile=True)
+def _decode_to_centroids_impl(
+        offsets_centroids: tf.Tensor,
+        centroids_boxes_default: tf.Tensor,
+        standard_deviations_centroids_offsets: tf.Tensor
+    ) -> tf.Tensor:
+    """
+    decode standardized centroids offsets to centroids coordinates, shared by all DataEncoderDecoder instances (see DataEncoderDecoder.decode_to_centroids)\n
+    use .python_function to run it without xla
 
-    # clip values out of range
-    image_batch = tf.clip_by_value(image_batch, clip_value_min=0.0, clip_value_max=255.0)
+    Args:
+        offsets_centroids (tf.Tensor): standardized offsets for centroids coordinates (center-x, center-y, width, height)
+        centroids_boxes_default (tf.Tensor): centroids coordinates for default bounding boxes (center_x, center_y, width, height), stacked on the last axis
+        standard_deviations_centroids_offsets (tf.Tensor): standard deviations for centroids offsets (center_x, center_y, width, height)
 
-    return image_batch, targets_batch
+    Returns:
+        tf.Tensor: decoded centroids coordinates, with 4 values on last axis
+    """
+
+    # decode offsets to centroids coordinates, all the 4 coordinates at once
+    # center x and center y are linear in the offsets, width and height are exponential
+    offsets_centroids = offsets_centroids * standard_deviations_centroids_offsets
+    centroids = tf.concat(
+        values=[
+            offsets_centroids[..., 0:2] * centroids_boxes_default[:, 2:4] + centroids_boxes_default[:, 0:2],
+            tf.math.expm1(offsets_centroids[..., 2:4]) * centroids_boxes_default[:, 2:4]
+        ],
+        axis=-1
+    )
+
+    # set to zero decoded coordinates for invalid boxes (default bounding boxes that were not matched to any ground truth)
+    not_background = tf.math.reduce_any(tf.math.not_equal(offsets_centroids, 0.0), axis=-1, keepdims=True)
+
+    return tf.where(not_background, centroids, 0.0)
+
+@tf.function(input_signature=_DECODING_INPUT_SIGNATURE, jit_compile=True)
+def _decode_to_corners_impl(
+        offsets_centroids: tf.Tensor,
+        centroids_boxes_default: tf.Tensor,
+        standard_deviations_centroids_offsets: tf.Tensor
+    ) -> tf.Tensor:
+    """
+    decode standardized centroids offsets to corners coordinates, shared by all DataEncoderDecoder instances (see DataEncoderDecoder.decode_to_corners)\n
+    use .python_function to run it without xla
+
+    Args:
+        offsets_centroids (tf.Tensor): standardized offsets for centroids coordinates (center-x, center-y, width, height)
+        centroids_boxes_default (tf.Tensor): centroids coordinates for default bounding boxes (center_x, center_y, width, height), stacked on the last axis
+        standard_deviations_centroids_offsets (tf.Tensor): standard deviations for centroids offsets (center_x, center_y, width, height)
+
+    Returns:
+        tf.Tensor: decoded corners coordinates, with 4 values on last axis
+    """
+
+    # decode offsets to centroids coordinates (python function, so it's fused in the same xla cluster)
+    centroids = _decode_to_centroids_impl.python_function(offsets_centroids, centroids_boxes_default, standard_deviations_centroids_offsets)
+
+    # convert to corners coordinates, all the 4 coordinates at once
+    # note: pixels coordinates should be threated as image indexes, be careful with +-1 operations
+    half_sizes = (centroids[..., 2:4] - 1.0) / 2.0
+    corners = tf.concat([centroids[..., 0:2] - half_sizes, centroids[..., 0:2] + half_sizes], axis=-1)
+
+    # set to zero decoded coordinates for invalid boxes (default bounding boxes that were not matched to any ground truth)
+    not_background = tf.math.reduce_any(tf.math.not_equal(centroids, 0.0), axis=-1, keepdims=True)
+
+    return tf.where(not_background, corners, 0.0)
 
 def read_image(path_file_image: str) -> tf.Tensor:
     """
@@ -473,12 +1109,109 @@ def read_image(path_file_image: str) -> tf.Tensor:
         path_file_image (str): path and filename for input image
 
     Returns:
-        tf.Tensor: a tensor representing the input image
+        tf.Tensor: a tensor representing the input image, kept as uint8 (it's cast to float inside the model)
     """
 
     # read the image
     image = tf.io.read_file(path_file_image)
     image = tf.image.decode_png(image, channels=3)
-    image = tf.cast(image, dtype=tf.float32)
 
-    return image
\ No newline at end of file
+    return image
+
+def build_tfrecords(
+        path_files_images: list[str],
+        path_files_masks: list[str],
+        path_files_labels_boxes: list[str],
+        path_file_tfrecords: str,
+        num_shards: int = 1,
+        data_encoder_decoder: DataEncoderDecoder = None
+    ) -> list[str]:
+    """
+    pack images, segmentation masks and labels boxes into sharded tfrecord files, to be run once offline\n
+    images and masks are stored as png encoded bytes, labels and boxes coordinates are parsed from the csv files and stored as lists\n
+    optionally labels and boxes are also stored already encoded, using the numba encoder (requires numba), see DataEncoderDecoder.read_encoded
+
+    Args:
+        path_files_images (list[str]): paths and filenames for input images
+        path_files_masks (list[str]): paths and filenames for ground truth segmentation masks
+        path_files_labels_boxes (list[str]): paths and filenames for ground truth labels and boxes
+        path_file_tfrecords (str): path and filename prefix for the output tfrecord files
+        num_shards (int, optional): number of tfrecord files to write. Defaults to 1.
+        data_encoder_decoder (DataEncoderDecoder, optional): if passed, labels and boxes are encoded with its default bounding boxes and settings (horizontal flip it's not applied). Defaults to None.
+
+    Returns:
+        list[str]: paths and filenames for the written tfrecord files
+    """
+
+    # numba it's needed only for offline encoding
+    # default bounding boxes and standard deviations are converted to numpy arrays once, they are the same for all examples
+    if data_encoder_decoder is not None:
+        from .datadecoder_numpy import encode_ground_truth_labels_boxes
+        xmin_boxes_default = data_encoder_decoder.xmin_boxes_default.numpy()
+        ymin_boxes_default = data_encoder_decoder.ymin_boxes_default.numpy()
+        xmax_boxes_default = data_encoder_decoder.xmax_boxes_default.numpy()
+        ymax_boxes_default = data_encoder_decoder.ymax_boxes_default.numpy()
+        standard_deviations_centroids_offsets = np.array(
+            [
+                data_encoder_decoder.standard_deviation_center_x_offsets,
+                data_encoder_decoder.standard_deviation_center_y_offsets,
+                data_encoder_decoder.standard_deviation_width_offsets,
+                data_encoder_decoder.standard_deviation_height_offsets
+            ],
+            dtype=np.float32
+        )
+
+    # samples are assigned to shards in a round robin fashion
+    samples = list(zip(path_files_images, path_files_masks, path_files_labels_boxes))
+    path_files_tfrecords = [f'{path_file_tfrecords}-{shard:05d}-of-{num_shards:05d}.tfrecord' for shard in range(num_shards)]
+
+    for shard, path_file_tfrecord in enumerate(path_files_tfrecords):
+        with tf.io.TFRecordWriter(path_file_tfrecord) as writer:
+            for path_file_image, path_file_mask, path_file_labels_boxes in samples[shard::num_shards]:
+
+                # read image and mask as raw png bytes, they are decoded by the data pipeline
+                with open(path_file_image, 'rb') as f:
+                    image_encoded = f.read()
+                with open(path_file_mask, 'rb') as f:
+                    mask_encoded = f.read()
+
+                # read labels boxes csv file, one row for each ground truth box (label, xmin, ymin, xmax, ymax)
+                with open(path_file_labels_boxes, 'r') as f:
+                    labels_boxes = [row for row in csv.reader(f) if row]
+                labels, xmin, ymin, xmax, ymax = zip(*labels_boxes) if labels_boxes else ((),) * 5
+
+                # example features
+                feature = {
+                    'image/encoded': tf.train.Feature(bytes_list=tf.train.BytesList(value=[image_encoded])),
+                    'mask/encoded': tf.train.Feature(bytes_list=tf.train.BytesList(value=[mask_encoded])),
+                    'labels': tf.train.Feature(int64_list=tf.train.Int64List(value=[int(label) for label in labels])),
+                    'xmin': tf.train.Feature(float_list=tf.train.FloatList(value=[float(coordinate) for coordinate in xmin])),
+                    'ymin': tf.train.Feature(float_list=tf.train.FloatList(value=[float(coordinate) for coordinate in ymin])),
+                    'xmax': tf.train.Feature(float_list=tf.train.FloatList(value=[float(coordinate) for coordinate in xmax])),
+                    'ymax': tf.train.Feature(float_list=tf.train.FloatList(value=[float(coordinate) for coordinate in ymax])),
+                }
+
+                # encoded labels and boxes, flattened
+                if data_encoder_decoder is not None:
+                    labels_encoded, boxes_encoded = encode_ground_truth_labels_boxes(
+                        xmin_boxes_default,
+                        ymin_boxes_default,
+                        xmax_boxes_default,
+                        ymax_boxes_default,
+                        np.array([int(label) for label in labels], dtype=np.int64),
+                        np.array([float(coordinate) for coordinate in xmin], dtype=np.float32),
+                        np.array([float(coordinate) for coordinate in ymin], dtype=np.float32),
+                        np.array([float(coordinate) for coordinate in xmax], dtype=np.float32),
+                        np.array([float(coordinate) for coordinate in ymax], dtype=np.float32),
+                        data_encoder_decoder.num_classes,
+                        data_encoder_decoder.iou_threshold,
+                        standard_deviations_centroids_offsets
+                    )
+                    feature['labels/encoded'] = tf.train.Feature(float_list=tf.train.FloatList(value=labels_encoded.ravel()))
+                    feature['boxes/encoded'] = tf.train.Feature(float_list=tf.train.FloatList(value=boxes_encoded.ravel()))
+
+                # serialize the example
+                example = tf.train.Example(features=tf.train.Features(feature=feature))
+                writer.write(example.SerializeToString())
+
+    return path_files_tfrecords
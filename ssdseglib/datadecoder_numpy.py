@@ -0,0 +1,112 @@
+from numba import njit, prange
+import numpy as np
+
+# float32 constants, so numba doesn't promote the float32 coordinates to float64 (the tensorflow encoder works in float32)
+_ZERO = np.float32(0.0)
+_ONE = np.float32(1.0)
+_TWO = np.float32(2.0)
+
+# note: no fastmath, operations must not be reordered to keep the same rounding of the tensorflow encoder
+@njit(parallel=True, cache=True)
+def encode_ground_truth_labels_boxes(
+        xmin_boxes_default: np.ndarray,
+        ymin_boxes_default: np.ndarray,
+        xmax_boxes_default: np.ndarray,
+        ymax_boxes_default: np.ndarray,
+        labels_ground_truth: np.ndarray,
+        xmin_boxes_ground_truth: np.ndarray,
+        ymin_boxes_ground_truth: np.ndarray,
+        xmax_boxes_ground_truth: np.ndarray,
+        ymax_boxes_ground_truth: np.ndarray,
+        num_classes: int,
+        iou_threshold: float,
+        standard_deviations_centroids_offsets: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+    """
+    encode ground truth data as required by a single-shot-detector network, numpy version compiled with numba\n
+    it's meant for offline preprocessing, it follows DataEncoderDecoder._encode_ground_truth_labels_boxes (without horizontal flip) operation by operation in float32\n
+    so matches (labels) are the same, while offsets can differ in the last float32 digit (tensorflow kernels like reciprocal and log1p are not guaranteed to round as numpy does)
+
+    Args:
+        xmin_boxes_default (np.ndarray): xmin coordinates for default bounding boxes, with shape (total default boxes,)
+        ymin_boxes_default (np.ndarray): ymin coordinates for default bounding boxes, with shape (total default boxes,)
+        xmax_boxes_default (np.ndarray): xmax coordinates for default bounding boxes, with shape (total default boxes,)
+        ymax_boxes_default (np.ndarray): ymax coordinates for default bounding boxes, with shape (total default boxes,)
+        labels_ground_truth (np.ndarray): ground truth labels, with shape (total ground truth boxes,)
+        xmin_boxes_ground_truth (np.ndarray): xmin coordinates for ground truth boxes, with shape (total ground truth boxes,)
+        ymin_boxes_ground_truth (np.ndarray): ymin coordinates for ground truth boxes, with shape (total ground truth boxes,)
+        xmax_boxes_ground_truth (np.ndarray): xmax coordinates for ground truth boxes, with shape (total ground truth boxes,)
+        ymax_boxes_ground_truth (np.ndarray): ymax coordinates for ground truth boxes, with shape (total ground truth boxes,)
+        num_classes (int): number of classes, including background
+        iou_threshold (float): minimum intersection over union threshold with ground truth boxes to consider a default bounding box not background
+        standard_deviations_centroids_offsets (np.ndarray): standard deviations for centroids offsets (center_x, center_y, width, height)
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: encoded labels (one hot encoded) and offsets, with shape (total default boxes, num classes) and (total default boxes, 4)
+    """
+
+    num_boxes_default = xmin_boxes_default.shape[0]
+    num_boxes_ground_truth = xmin_boxes_ground_truth.shape[0]
+    iou_threshold = np.float32(iou_threshold)
+
+    # intersection over union between each default bounding box and all ground truth bounding boxes
+    # each ground truth box it's processed in parallel, default bounding boxes without horizontal overlap are skipped
+    iou = np.zeros((num_boxes_default, num_boxes_ground_truth), dtype=np.float32)
+    for index_ground_truth in prange(num_boxes_ground_truth):
+        boxes_area_ground_truth = (xmax_boxes_ground_truth[index_ground_truth] - xmin_boxes_ground_truth[index_ground_truth] + _ONE) * (ymax_boxes_ground_truth[index_ground_truth] - ymin_boxes_ground_truth[index_ground_truth] + _ONE)
+        for index_default in range(num_boxes_default):
+            width_intersection = min(xmax_boxes_default[index_default], xmax_boxes_ground_truth[index_ground_truth]) - max(xmin_boxes_default[index_default], xmin_boxes_ground_truth[index_ground_truth]) + _ONE
+            if width_intersection <= _ZERO:
+                continue
+            height_intersection = min(ymax_boxes_default[index_default], ymax_boxes_ground_truth[index_ground_truth]) - max(ymin_boxes_default[index_default], ymin_boxes_ground_truth[index_ground_truth]) + _ONE
+            if height_intersection <= _ZERO:
+                continue
+            boxes_area_default = (ymax_boxes_default[index_default] - ymin_boxes_default[index_default] + _ONE) * (xmax_boxes_default[index_default] - xmin_boxes_default[index_default] + _ONE)
+            boxes_area_intersection = width_intersection * height_intersection
+            iou[index_default, index_ground_truth] = boxes_area_intersection / (boxes_area_default + boxes_area_ground_truth - boxes_area_intersection)
+
+    # step 2 - best ground truth box for each default box (the first one in case of ties), matched if iou > threshold
+    index_ground_truth_match = np.full(num_boxes_default, -1, dtype=np.int64)
+    for index_default in prange(num_boxes_default):
+        if num_boxes_ground_truth > 0:
+            index_ground_truth = np.argmax(iou[index_default])
+            if iou[index_default, index_ground_truth] > iou_threshold:
+                index_ground_truth_match[index_default] = index_ground_truth
+
+    # step 1 - best default box for each ground truth box (with iou > 0), it overrides the match from step 2
+    # ground truth boxes are processed in order, so if two of them share the same best default box the first one it's kept
+    forced = np.zeros(num_boxes_default, dtype=np.bool_)
+    for index_ground_truth in range(num_boxes_ground_truth):
+        index_default = np.argmax(iou[:, index_ground_truth])
+        if iou[index_default, index_ground_truth] > _ZERO and not forced[index_default]:
+            forced[index_default] = True
+            index_ground_truth_match[index_default] = index_ground_truth
+
+    # step 3 - assign labels and standardized centroids offsets
+    # default bounding boxes without a match are assigned to background class with zero offsets
+    labels_encoded = np.zeros((num_boxes_default, num_classes), dtype=np.float32)
+    offsets_encoded = np.zeros((num_boxes_default, 4), dtype=np.float32)
+    for index_default in prange(num_boxes_default):
+        index_ground_truth = index_ground_truth_match[index_default]
+        if index_ground_truth < 0:
+            labels_encoded[index_default, 0] = _ONE
+            continue
+
+        # note: pixels coordinates should be threated as image indexes, be careful with +-1 operations
+        center_x_default = (xmax_boxes_default[index_default] + xmin_boxes_default[index_default]) / _TWO
+        center_y_default = (ymax_boxes_default[index_default] + ymin_boxes_default[index_default]) / _TWO
+        width_default = xmax_boxes_default[index_default] - xmin_boxes_default[index_default] + _ONE
+        height_default = ymax_boxes_default[index_default] - ymin_boxes_default[index_default] + _ONE
+        center_x_ground_truth = (xmax_boxes_ground_truth[index_ground_truth] + xmin_boxes_ground_truth[index_ground_truth]) / _TWO
+        center_y_ground_truth = (ymax_boxes_ground_truth[index_ground_truth] + ymin_boxes_ground_truth[index_ground_truth]) / _TWO
+        width_ground_truth = xmax_boxes_ground_truth[index_ground_truth] - xmin_boxes_ground_truth[index_ground_truth] + _ONE
+        height_ground_truth = ymax_boxes_ground_truth[index_ground_truth] - ymin_boxes_ground_truth[index_ground_truth] + _ONE
+
+        # standardization with reciprocals, same as the tensorflow encoder
+        labels_encoded[index_default, labels_ground_truth[index_ground_truth]] = _ONE
+        offsets_encoded[index_default, 0] = (center_x_ground_truth - center_x_default) * (_ONE / (width_default * standard_deviations_centroids_offsets[0]))
+        offsets_encoded[index_default, 1] = (center_y_ground_truth - center_y_default) * (_ONE / (height_default * standard_deviations_centroids_offsets[1]))
+        offsets_encoded[index_default, 2] = np.log1p(width_ground_truth / width_default) * (_ONE / standard_deviations_centroids_offsets[2])
+        offsets_encoded[index_default, 3] = np.log1p(height_ground_truth / height_default) * (_ONE / standard_deviations_centroids_offsets[3])
+
+    return labels_encoded, offsets_encoded
@@ -66,8 +66,8 @@ class DecodeBoxesCentroidsOffsets(tf.keras.layers.Layer):
         # decode centroids offsets to centroids coordinates
         center_x = center_x_offsets * self.standard_deviation_center_x_offsets * self.width_boxes_default + self.center_x_boxes_default
         center_y = center_y_offsets * self.standard_deviation_center_y_offsets * self.height_boxes_default + self.center_y_boxes_default
-        width = (tf.math.exp(width_offsets * self.standard_deviation_width_offsets) - 1.0) * self.width_boxes_default
-        height = (tf.math.exp(height_offsets * self.standard_deviation_height_offsets) - 1.0) * self.height_boxes_default
+        width = tf.math.expm1(width_offsets * self.standard_deviation_width_offsets) * self.width_boxes_default
+        height = tf.math.expm1(height_offsets * self.standard_deviation_height_offsets) * self.height_boxes_default
 
         # convert centroids to corners coordinates
         xmin = center_x - (width - 1.0) / 2.0
@@ -241,4 +241,108 @@ class Split(tf.keras.layers.Layer):
             'num_or_size_split': self.num_or_size_split,
             'axis': self.axis,
             'num': self.num
-        }
\ No newline at end of file
+        }
+
+@tf.keras.saving.register_keras_serializable(name='RandomHueSaturation')
+class RandomHueSaturation(tf.keras.layers.Layer):
+    def __init__(self, max_delta_hue: float, lower_saturation: float, upper_saturation: float, **kwargs):
+        """
+        randomly change hue and saturation of an image batch, only during training\n
+        inputs are cast to the layer dtype, so uint8 images can be passed directly
+
+        Args:
+            max_delta_hue (float): maximum hue change, must be in the interval [0, 0.5]
+            lower_saturation (float): lower bound for the random saturation factor
+            upper_saturation (float): upper bound for the random saturation factor
+        """
+        # init from parent class
+        super().__init__(**kwargs)
+
+        # set attributes
+        self.max_delta_hue = max_delta_hue
+        self.lower_saturation = lower_saturation
+        self.upper_saturation = upper_saturation
+
+    def call(self, images: tf.Tensor, training: bool = None) -> tf.Tensor:
+        # cast to float (images could be uint8)
+        images = tf.cast(images, dtype=self.compute_dtype)
+
+        # augmentation it's applied only during training
+        if not training:
+            return images
+
+        # small hue and saturation change
+        images = tf.image.random_hue(images, max_delta=self.max_delta_hue)
+        images = tf.image.random_saturation(images, lower=self.lower_saturation, upper=self.upper_saturation)
+
+        # clip values out of range
+        images = tf.clip_by_value(images, clip_value_min=0.0, clip_value_max=255.0)
+
+        return images
+
+    def get_config(self):
+        return {
+            'max_delta_hue': self.max_delta_hue,
+            'lower_saturation': self.lower_saturation,
+            'upper_saturation': self.upper_saturation
+        }
+
+@tf.keras.saving.register_keras_serializable(name='RandomBrightnessDelta')
+class RandomBrightnessDelta(tf.keras.layers.Layer):
+    def __init__(self, max_delta: float, **kwargs):
+        """
+        randomly shift brightness of an image batch by a delta in [-max_delta, max_delta), only during training\n
+        same as tf.image.random_brightness, the delta it's added to pixel values as they are (no rescaling to the image range)
+
+        Args:
+            max_delta (float): maximum brightness shift
+        """
+        # init from parent class
+        super().__init__(**kwargs)
+
+        # set attributes
+        self.max_delta = max_delta
+
+    def call(self, images: tf.Tensor, training: bool = None) -> tf.Tensor:
+        # cast to float (images could be uint8)
+        images = tf.cast(images, dtype=self.compute_dtype)
+
+        # augmentation it's applied only during training
+        if not training:
+            return images
+
+        # small brightness change
+        images = tf.image.random_brightness(images, max_delta=self.max_delta)
+
+        # clip values out of range
+        images = tf.clip_by_value(images, clip_value_min=0.0, clip_value_max=255.0)
+
+        return images
+
+    def get_config(self):
+        return {
+            'max_delta': self.max_delta
+        }
+
+def build_augmentation_rgb_channels() -> tf.keras.Sequential:
+    """
+    create the rgb channels augmentation, to be prepended to the model input during training so that it runs on the accelerator\n
+    e.g. model = tf.keras.Sequential([build_augmentation_rgb_channels(), network]), it replaces the rgb channels augmentation previously mapped on the tf.data pipeline\n
+    hue, saturation, contrast and brightness changes are randomly applied within a reasonable range, only during training\n
+    input images are expected as uint8 (or float in the range [0, 255]), transformed values are clipped between 0 and 255
+
+    Returns:
+        tf.keras.Sequential: a model applying the rgb channels augmentation to an image batch
+    """
+
+    return tf.keras.Sequential(
+        layers=[
+            # small hue and saturation change
+            RandomHueSaturation(max_delta_hue=0.05, lower_saturation=0.95, upper_saturation=1.05),
+            # small contrast change
+            tf.keras.layers.RandomContrast(factor=0.10),
+            # small brightness change
+            RandomBrightnessDelta(max_delta=0.10),
+        ],
+        name='augmentation-rgb-channels'
+    )